@@ -1,9 +1,12 @@
 import streamlit as st
 from groq import Groq
 import base64
-import json
+import orjson
 from PIL import Image
 import io
+import os
+import cv2
+import numpy as np
 import time
 
 # --- Page Config ---
@@ -15,119 +18,57 @@ st.set_page_config(
 )
 
 # --- Custom CSS for better UI ---
-st.markdown("""
-<style>
-    /* Main container styling */
-    .main > div {
-        padding-top: 2rem;
-    }
-    
-    /* Header styling */
-    .header-container {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        padding: 2rem;
-        border-radius: 15px;
-        margin-bottom: 2rem;
-        text-align: center;
-        color: white;
-    }
-    
-    .header-title {
-        font-size: 2.5rem;
-        font-weight: 700;
-        margin-bottom: 0.5rem;
-    }
-    
-    .header-subtitle {
-        font-size: 1.1rem;
-        opacity: 0.9;
-    }
-    
-    /* Card styling */
-    .upload-card {
-        background: #f8f9fa;
-        border-radius: 15px;
-        padding: 2rem;
-        border: 2px dashed #dee2e6;
-        text-align: center;
-    }
-    
-    .result-card {
-        background: linear-gradient(135deg, #f5f7fa 0%, #c3cfe2 100%);
-        border-radius: 15px;
-        padding: 1.5rem;
-        margin-top: 1rem;
-    }
-    
-    /* Button styling */
-    .stButton > button {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        border: none;
-        padding: 0.75rem 2rem;
-        font-size: 1.1rem;
-        font-weight: 600;
-        border-radius: 10px;
-        width: 100%;
-        transition: transform 0.2s;
-    }
-    
-    .stButton > button:hover {
-        transform: scale(1.02);
-    }
-    
-    /* Image container */
-    .image-container {
-        border-radius: 15px;
-        overflow: hidden;
-        box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-    }
-    
-    /* Result metrics */
-    .metric-box {
-        background: white;
-        padding: 1rem;
-        border-radius: 10px;
-        text-align: center;
-        box-shadow: 0 2px 8px rgba(0,0,0,0.05);
-        margin-bottom: 0.5rem;
-    }
-    
-    .metric-label {
-        font-size: 0.8rem;
-        color: #6c757d;
-        text-transform: uppercase;
-        letter-spacing: 1px;
-    }
-    
-    .metric-value {
-        font-size: 1.3rem;
-        font-weight: 700;
-        color: #333;
-    }
-    
-    /* Hide Streamlit branding */
-    #MainMenu {visibility: hidden;}
-    footer {visibility: hidden;}
-</style>
-""", unsafe_allow_html=True)
+@st.cache_data
+def _css():
+    """Stylesheet contents, read from disk once per process"""
+    with open(os.path.join(os.path.dirname(__file__), "style.css")) as f:
+        return f.read()
+
+st.markdown(f"<style>{_css()}</style>", unsafe_allow_html=True)
 
 # --- API Key ---
 # For local development: create .streamlit/secrets.toml with GROQ_API_KEY = "your_key"
 # For Streamlit Cloud: add secret in app settings
-import os
 try:
     GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
 except:
     GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
 
+@st.cache_resource
+def get_groq_client():
+    """Shared Groq client, so its connection pool survives reruns"""
+    return Groq(api_key=GROQ_API_KEY)
+
 # --- Backend Logic ---
-def process_vision_data(image_file):
-    """Function to process image and extract JSON data"""
-    client = Groq(api_key=GROQ_API_KEY)
-    
-    # Convert image to Base64
-    base64_image = base64.b64encode(image_file.getvalue()).decode('utf-8')
+# Labels stay legible well below full camera resolution, so downscale before upload
+MAX_IMAGE_EDGE = 1024
+JPEG_QUALITY = 75
+DATA_URL_PREFIX = b"data:image/jpeg;base64,"
+
+def _prepare_payload(raw_bytes):
+    """Downscale and re-encode image bytes as JPEG, returned as a Base64 data URL"""
+    img = cv2.imdecode(np.frombuffer(raw_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("could not decode image")
+    h, w = img.shape[:2]
+    scale = MAX_IMAGE_EDGE / max(h, w)
+    if scale < 1:
+        img = cv2.resize(
+            img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA
+        )
+    ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    if not ok:
+        raise ValueError("could not encode image")
+    return (DATA_URL_PREFIX + base64.b64encode(buf.tobytes())).decode('ascii')
+
+# Errors are raised rather than returned so that failed scans are not cached
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def _cached_extract(image_bytes: bytes) -> dict:
+    """Run the vision model on image bytes; repeat scans of the same image hit the cache"""
+    client = get_groq_client()
+
+    # Shrink image and convert to a Base64 data URL
+    image_url = _prepare_payload(image_bytes)
 
     # Prompt for vision model
     prompt = """
@@ -139,27 +80,73 @@ def process_vision_data(image_file):
     If any field is missing, set it to "N/A". Return ONLY the JSON object.
     """
 
+    completion = client.chat.completions.create(
+        model="meta-llama/llama-4-scout-17b-16e-instruct",
+        messages=[
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url,
+                            "detail": "low"
+                        }
+                    },
+                ],
+            }
+        ],
+        response_format={"type": "json_object"}
+    )
+    return orjson.loads(completion.choices[0].message.content)
+
+def process_vision_data(image_bytes):
+    """Function to process image and extract JSON data"""
     try:
-        completion = client.chat.completions.create(
-            model="meta-llama/llama-4-scout-17b-16e-instruct",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
-                        },
-                    ],
-                }
-            ],
-            response_format={"type": "json_object"}
-        )
-        return json.loads(completion.choices[0].message.content)
+        return _cached_extract(image_bytes)
     except Exception as e:
         return {"error": str(e)}
 
+# --- Extraction Panel ---
+# Runs as a fragment so clicking Extract only reruns this panel, not the whole page
+@st.fragment
+def extraction_panel(image_bytes):
+    """Extract button and results for the uploaded image"""
+    if st.button("🔍 Extract Information", use_container_width=True):
+        with st.spinner("🤖 AI is analyzing the image..."):
+            start_time = time.time()
+            extracted_data = process_vision_data(image_bytes)
+            processing_time = time.time() - start_time
+        
+        if "error" in extracted_data:
+            st.error(f"❌ Error: {extracted_data['error']}")
+        else:
+            st.success(f"✅ Extracted in {processing_time:.2f} seconds")
+            
+            # Display results in a nice grid
+            st.markdown("---")
+            
+            # 2x2 metric grid, rendered as a single HTML block
+            metrics = [
+                ("Brand", extracted_data.get('brand', 'N/A')),
+                ("Generation", extracted_data.get('generation', 'N/A')),
+                ("Capacity", extracted_data.get('capacity', 'N/A')),
+                ("Bus Speed", f"{extracted_data.get('speed', 'N/A')} MHz"),
+            ]
+            boxes = "".join(
+                f'<div class="metric-box">'
+                f'<div class="metric-label">{label}</div>'
+                f'<div class="metric-value">{value}</div>'
+                f'</div>'
+                for label, value in metrics
+            )
+            st.markdown(f'<div class="metric-grid">{boxes}</div>', unsafe_allow_html=True)
+            
+            # JSON output (collapsible)
+            with st.expander("📋 View Raw JSON"):
+                st.json(extracted_data)
+
 # --- Header ---
 st.markdown("""
 <div class="header-container">
@@ -180,69 +167,22 @@ with col1:
     )
     
     if uploaded_file:
+        # Read the upload once and reuse the bytes below
+        raw = uploaded_file.getvalue()
+        
         st.markdown("---")
         st.markdown("### 🖼️ Preview")
         st.image(uploaded_file, caption="Uploaded Hardware Label", use_column_width=True)
         
         # File info
-        file_size = len(uploaded_file.getvalue()) / 1024
+        file_size = len(raw) / 1024
         st.caption(f"📁 {uploaded_file.name} • {file_size:.1f} KB")
 
 with col2:
     st.markdown("### 📊 Extracted Data")
     
     if uploaded_file:
-        if st.button("🔍 Extract Information", use_container_width=True):
-            with st.spinner("🤖 AI is analyzing the image..."):
-                start_time = time.time()
-                extracted_data = process_vision_data(uploaded_file)
-                processing_time = time.time() - start_time
-            
-            if "error" in extracted_data:
-                st.error(f"❌ Error: {extracted_data['error']}")
-            else:
-                st.success(f"✅ Extracted in {processing_time:.2f} seconds")
-                
-                # Display results in a nice grid
-                st.markdown("---")
-                
-                # Row 1: Brand & Generation
-                r1c1, r1c2 = st.columns(2)
-                with r1c1:
-                    st.markdown(f"""
-                    <div class="metric-box">
-                        <div class="metric-label">Brand</div>
-                        <div class="metric-value">{extracted_data.get('brand', 'N/A')}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                with r1c2:
-                    st.markdown(f"""
-                    <div class="metric-box">
-                        <div class="metric-label">Generation</div>
-                        <div class="metric-value">{extracted_data.get('generation', 'N/A')}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # Row 2: Capacity & Speed
-                r2c1, r2c2 = st.columns(2)
-                with r2c1:
-                    st.markdown(f"""
-                    <div class="metric-box">
-                        <div class="metric-label">Capacity</div>
-                        <div class="metric-value">{extracted_data.get('capacity', 'N/A')}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                with r2c2:
-                    st.markdown(f"""
-                    <div class="metric-box">
-                        <div class="metric-label">Bus Speed</div>
-                        <div class="metric-value">{extracted_data.get('speed', 'N/A')} MHz</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-                
-                # JSON output (collapsible)
-                with st.expander("📋 View Raw JSON"):
-                    st.json(extracted_data)
+        extraction_panel(raw)
     else:
         st.info("👈 Upload an image to get started")
         st.markdown("""
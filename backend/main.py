@@ -1,17 +1,37 @@
 import os
-import json
+import orjson
+import asyncio
+import sqlite3
+import threading
+import time
+import secrets
 import base64
 import io
 from datetime import datetime
 from typing import List, Optional
 from fastapi import FastAPI, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from groq import Groq
+from groq import AsyncGroq
+import cv2
+import numpy as np
 from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
 from dotenv import load_dotenv
 
+# Optional: torchvision encodes JPEGs faster and can resize on the GPU
+try:
+    import torch
+    from torchvision.io import ImageReadMode, decode_image, encode_jpeg
+    from torchvision.transforms.v2 import functional as TF
+    HAS_TORCH = True
+except ImportError:
+    HAS_TORCH = False
+
 load_dotenv()
 
 app = FastAPI(title="Hardware Inventory Scanner API")
@@ -25,8 +45,159 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory session storage (for demo; use Redis/DB in production)
-sessions = {}
+# Groq client is shared across requests to reuse its connection pool
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
+client = AsyncGroq(api_key=GROQ_API_KEY) if GROQ_API_KEY else None
+
+# --- Session Storage ---
+# Sessions live in SQLite so that every uvicorn worker sees the same data.
+# Abandoned sessions expire, and the oldest are dropped beyond SESSION_LIMIT.
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", "sessions.db")
+SESSION_LIMIT = 10_000
+SESSION_TTL_SECONDS = 24 * 3600
+
+class SessionStore:
+    """Dict-like session storage backed by a SQLite database"""
+
+    def __init__(self, path: str, ttl_seconds: float, max_sessions: int):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._local = threading.local()
+        conn = self._connect()
+        # WAL lets readers in other workers proceed while one worker writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "id TEXT PRIMARY KEY, started_at TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS items ("
+                "session_id TEXT NOT NULL REFERENCES sessions(id) ON DELETE CASCADE, "
+                "data BLOB NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS items_session ON items(session_id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, as sqlite3 connections are not shareable"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl_seconds
+
+    def __contains__(self, session_id: str) -> bool:
+        row = self._connect().execute(
+            "SELECT 1 FROM sessions WHERE id = ? AND created >= ?",
+            (session_id, self._cutoff())
+        ).fetchone()
+        return row is not None
+
+    def get(self, session_id: str, default=None):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT started_at FROM sessions WHERE id = ? AND created >= ?",
+            (session_id, self._cutoff())
+        ).fetchone()
+        if row is None:
+            return default
+        items = conn.execute(
+            "SELECT data FROM items WHERE session_id = ? ORDER BY rowid", (session_id,)
+        ).fetchall()
+        return {"items": [orjson.loads(data) for (data,) in items], "started_at": row[0]}
+
+    def __getitem__(self, session_id: str) -> dict:
+        session = self.get(session_id)
+        if session is None:
+            raise KeyError(session_id)
+        return session
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop expired sessions and the oldest ones beyond max_sessions"""
+        conn.execute("DELETE FROM sessions WHERE created < ?", (self._cutoff(),))
+        conn.execute(
+            "DELETE FROM sessions WHERE id IN ("
+            "SELECT id FROM sessions ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,)
+        )
+
+    def __setitem__(self, session_id: str, session: dict):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            conn.execute(
+                "INSERT INTO sessions (id, started_at, created) VALUES (?, ?, ?)",
+                (session_id, session["started_at"], time.time())
+            )
+            conn.executemany(
+                "INSERT INTO items (session_id, data) VALUES (?, ?)",
+                [(session_id, orjson.dumps(item)) for item in session["items"]]
+            )
+            self._evict(conn)
+
+    def __delitem__(self, session_id: str):
+        if not self.discard(session_id):
+            raise KeyError(session_id)
+
+    def discard(self, session_id: str) -> bool:
+        """Delete a session without loading it; returns whether it existed"""
+        conn = self._connect()
+        with conn:
+            deleted = conn.execute(
+                "DELETE FROM sessions WHERE id = ?", (session_id,)
+            ).rowcount
+        return deleted > 0
+
+    def pop(self, session_id: str, default=None):
+        session = self.get(session_id)
+        self.discard(session_id)
+        return default if session is None else session
+
+    def add_items(self, session_id: str, items_json: List[bytes]) -> int:
+        """Append JSON-encoded scanned items to a session and return its new scan count
+
+        The session is created if it does not exist or has expired, all in
+        one transaction.
+        """
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "DELETE FROM sessions WHERE id = ? AND created < ?",
+                (session_id, self._cutoff())
+            )
+            created = conn.execute(
+                "INSERT OR IGNORE INTO sessions (id, started_at, created) VALUES (?, ?, ?)",
+                (session_id, datetime.now().isoformat(), time.time())
+            ).rowcount
+            if created:
+                self._evict(conn)
+            conn.executemany(
+                "INSERT INTO items (session_id, data) VALUES (?, ?)",
+                [(session_id, item_json) for item_json in items_json]
+            )
+            return self.scan_count(session_id)
+
+    def add_item(self, session_id: str, item_json: bytes) -> int:
+        """Append a JSON-encoded scanned item to a session and return its new scan count"""
+        return self.add_items(session_id, [item_json])
+
+    def ensure(self, session_id: str) -> int:
+        """Create the session if it does not exist and return its scan count"""
+        return self.add_items(session_id, [])
+
+    def scan_count(self, session_id: str) -> int:
+        """Number of items scanned in a session"""
+        (count,) = self._connect().execute(
+            "SELECT COUNT(*) FROM items WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return count
+
+sessions = SessionStore(SESSION_DB_PATH, SESSION_TTL_SECONDS, SESSION_LIMIT)
 
 # --- Models ---
 class ImageRequest(BaseModel):
@@ -40,25 +211,99 @@ class HardwareData(BaseModel):
     speed: str = "N/A"
     timestamp: Optional[str] = None
 
+# Fields filled from the model reply, in HardwareData order
+HARDWARE_FIELDS = ("capacity", "generation", "brand", "speed")
+
 class ProcessResponse(BaseModel):
     success: bool
     data: Optional[HardwareData] = None
     error: Optional[str] = None
     scan_count: int = 0
 
+class BatchImageRequest(BaseModel):
+    session_id: str
+    images_base64: List[str]  # Base64 encoded images (without data:image prefix)
+
+class BatchProcessResponse(BaseModel):
+    results: List[ProcessResponse]
+    scan_count: int = 0
+
 class SessionStats(BaseModel):
     session_id: str
     scan_count: int
     started_at: str
 
+# --- Image Preprocessing ---
+# Labels stay legible well below full camera resolution, so downscale before upload
+MAX_IMAGE_EDGE = 1024
+JPEG_QUALITY = 75
+DATA_URL_PREFIX = b"data:image/jpeg;base64,"
+
+# Leading bytes of the image formats we accept (JPEG, PNG)
+IMAGE_SIGNATURES = (b"\xff\xd8\xff", b"\x89PNG")
+
+UNSUPPORTED_IMAGE_ERROR = "Unsupported image, expected JPEG or PNG"
+
+# Upper bound on Groq calls in flight for a single batch request
+MAX_CONCURRENT_SCANS = 8
+
+def _is_supported_image(image_base64: str) -> bool:
+    """Check the first decoded bytes for a JPEG or PNG signature"""
+    try:
+        header = base64.b64decode(image_base64[:64], validate=True)
+    except ValueError:
+        return False
+    return header.startswith(IMAGE_SIGNATURES)
+
+def _prepare_payload(raw_bytes: bytes) -> str:
+    """Downscale and re-encode image bytes as JPEG, returned as a Base64 data URL"""
+    img = cv2.imdecode(np.frombuffer(raw_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        raise ValueError("could not decode image")
+    h, w = img.shape[:2]
+    scale = MAX_IMAGE_EDGE / max(h, w)
+    if scale < 1:
+        img = cv2.resize(
+            img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA
+        )
+    ok, buf = cv2.imencode(".jpg", img, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY])
+    if not ok:
+        raise ValueError("could not encode image")
+    return (DATA_URL_PREFIX + base64.b64encode(buf.tobytes())).decode("ascii")
+
+if HAS_TORCH:
+    TORCH_DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+    def _prepare_payload_torch(raw_bytes: bytes) -> str:
+        """torchvision variant of _prepare_payload, resizing on the GPU when available"""
+        data = torch.frombuffer(bytearray(raw_bytes), dtype=torch.uint8)
+        # Match cv2.imdecode, which applies EXIF orientation (re-encoding drops the tag)
+        tensor = decode_image(
+            data, mode=ImageReadMode.RGB, apply_exif_orientation=True
+        ).to(TORCH_DEVICE)
+        h, w = tensor.shape[-2:]
+        scale = MAX_IMAGE_EDGE / max(h, w)
+        if scale < 1:
+            tensor = TF.resize(tensor, [round(h * scale), round(w * scale)], antialias=True)
+        jpeg = encode_jpeg(tensor.cpu(), quality=JPEG_QUALITY)
+        return (DATA_URL_PREFIX + base64.b64encode(jpeg.numpy().tobytes())).decode("ascii")
+
 # --- Groq Vision Processing ---
-def extract_hardware_info(image_base64: str) -> dict:
+async def extract_hardware_info(image_base64: str) -> dict:
     """Process image with Groq Vision API to extract hardware info"""
-    api_key = os.environ.get("GROQ_API_KEY")
-    if not api_key:
+    # Reject non-images before spending any work or a Groq round-trip on them
+    if not _is_supported_image(image_base64):
+        raise HTTPException(status_code=400, detail=UNSUPPORTED_IMAGE_ERROR)
+    
+    if client is None:
         raise HTTPException(status_code=500, detail="GROQ_API_KEY not configured")
     
-    client = Groq(api_key=api_key)
+    try:
+        prepare = _prepare_payload_torch if HAS_TORCH else _prepare_payload
+        # Image work is CPU-bound, keep it off the event loop
+        image_url = await run_in_threadpool(prepare, base64.b64decode(image_base64))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
     
     prompt = """
     Extract the following information from this hardware label in JSON format:
@@ -70,7 +315,7 @@ def extract_hardware_info(image_base64: str) -> dict:
     """
     
     try:
-        completion = client.chat.completions.create(
+        completion = await client.chat.completions.create(
             model="meta-llama/llama-4-scout-17b-16e-instruct",
             messages=[
                 {
@@ -79,17 +324,36 @@ def extract_hardware_info(image_base64: str) -> dict:
                         {"type": "text", "text": prompt},
                         {
                             "type": "image_url",
-                            "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}
+                            "image_url": {
+                                "url": image_url,
+                                "detail": "low"
+                            }
                         },
                     ],
                 }
             ],
             response_format={"type": "json_object"}
         )
-        return json.loads(completion.choices[0].message.content)
+        result = orjson.loads(completion.choices[0].message.content)
+        if not isinstance(result, dict):
+            raise ValueError("Model reply is not a JSON object")
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _json_response(content: dict) -> Response:
+    """Serialize a response body with orjson, bypassing FastAPI's JSON encoder"""
+    return Response(content=orjson.dumps(content), media_type="application/json")
+
+def _hardware_item(result: dict) -> dict:
+    """Shape a model reply like HardwareData (string values, missing ones as "N/A") without validating it"""
+    item = {}
+    for field in HARDWARE_FIELDS:
+        value = result.get(field)
+        item[field] = str(value) if value not in (None, "") else "N/A"
+    item["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return item
+
 # --- API Endpoints ---
 @app.get("/")
 def health_check():
@@ -98,50 +362,102 @@ def health_check():
 @app.post("/api/start-session")
 def start_session():
     """Start a new scanning session"""
-    session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    session_id = secrets.token_urlsafe(9)
+    while session_id in sessions:
+        session_id = secrets.token_urlsafe(9)
     sessions[session_id] = {
         "items": [],
         "started_at": datetime.now().isoformat()
     }
     return {"session_id": session_id, "message": "Session started"}
 
-@app.post("/api/process-image", response_model=ProcessResponse)
-def process_image(request: ImageRequest):
+# Results skip Pydantic validation on the hot path and embed the item JSON that
+# was already serialized for session storage; the models only document the schema.
+@app.post("/api/process-image", responses={200: {"model": ProcessResponse}})
+async def process_image(request: ImageRequest):
     """Process a captured image and extract hardware information"""
-    if request.session_id not in sessions:
-        # Auto-create session if not exists
-        sessions[request.session_id] = {
-            "items": [],
-            "started_at": datetime.now().isoformat()
-        }
+    # Reject non-images before touching the session store
+    if not _is_supported_image(request.image_base64):
+        return {"success": False, "error": UNSUPPORTED_IMAGE_ERROR}
+    
+    # Auto-create session if not exists (SQLite calls block, keep them off the event loop)
+    await run_in_threadpool(sessions.ensure, request.session_id)
     
     try:
         # Extract hardware info from image
-        result = extract_hardware_info(request.image_base64)
+        result = await extract_hardware_info(request.image_base64)
         
-        # Add timestamp
-        result["timestamp"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # Fill defaults and add timestamp
+        item = _hardware_item(result)
         
         # Store in session
-        sessions[request.session_id]["items"].append(result)
+        item_json = orjson.dumps(item)
+        scan_count = await run_in_threadpool(sessions.add_item, request.session_id, item_json)
         
-        return ProcessResponse(
-            success=True,
-            data=HardwareData(**result),
-            scan_count=len(sessions[request.session_id]["items"])
-        )
+        return _json_response({
+            "success": True,
+            "data": orjson.Fragment(item_json),
+            "scan_count": scan_count
+        })
     except HTTPException as e:
-        return ProcessResponse(success=False, error=e.detail)
+        return {"success": False, "error": e.detail}
     except Exception as e:
-        return ProcessResponse(success=False, error=str(e))
+        return {"success": False, "error": str(e)}
+
+@app.post("/api/process-images", responses={200: {"model": BatchProcessResponse}})
+async def process_images(request: BatchImageRequest):
+    """Process several captured images concurrently"""
+    # Only create the session if at least one image is worth sending to Groq
+    if any(_is_supported_image(image) for image in request.images_base64):
+        # Auto-create session if not exists (SQLite calls block, keep them off the event loop)
+        scan_count = await run_in_threadpool(sessions.ensure, request.session_id)
+    else:
+        scan_count = await run_in_threadpool(sessions.scan_count, request.session_id)
+    
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SCANS)
+    
+    async def extract(image_base64: str) -> dict:
+        async with semaphore:
+            return await extract_hardware_info(image_base64)
+    
+    results = await asyncio.gather(
+        *(extract(image) for image in request.images_base64),
+        return_exceptions=True
+    )
+    
+    responses = []
+    items_json = []
+    for result in results:
+        if isinstance(result, HTTPException):
+            responses.append({"success": False, "error": result.detail})
+            continue
+        if isinstance(result, BaseException):
+            responses.append({"success": False, "error": str(result)})
+            continue
+        
+        item_json = orjson.dumps(_hardware_item(result))
+        items_json.append(item_json)
+        responses.append({"success": True, "data": orjson.Fragment(item_json)})
+    
+    # Store results in upload order, in a single transaction
+    if items_json:
+        scan_count = await run_in_threadpool(sessions.add_items, request.session_id, items_json)
+    
+    # Number each stored item by its position in the session
+    first_count = scan_count - len(items_json)
+    stored = (response for response in responses if response["success"])
+    for position, response in enumerate(stored, 1):
+        response["scan_count"] = first_count + position
+    
+    return _json_response({"results": responses, "scan_count": scan_count})
 
 @app.get("/api/session/{session_id}")
 def get_session(session_id: str):
     """Get session data"""
-    if session_id not in sessions:
+    session = sessions.get(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session = sessions[session_id]
     return {
         "session_id": session_id,
         "items": session["items"],
@@ -152,47 +468,50 @@ def get_session(session_id: str):
 @app.get("/api/export/{session_id}")
 def export_session(session_id: str):
     """Export session data as Excel file"""
-    if session_id not in sessions:
+    session = sessions.get(session_id)
+    if session is None:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    session = sessions[session_id]
     items = session["items"]
     
     if not items:
         raise HTTPException(status_code=400, detail="No items to export")
     
-    # Create Excel workbook
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Hardware Inventory"
+    # Create Excel workbook (write-only mode streams rows instead of keeping cells in memory)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Hardware Inventory")
     
-    # Header row
+    # Data rows, tracking the widest value per column as they are built
     headers = ["#", "Brand", "Capacity", "Generation", "Speed (MHz)", "Scanned At"]
-    for col, header in enumerate(headers, 1):
-        ws.cell(row=1, column=col, value=header)
-        ws.cell(row=1, column=col).font = ws.cell(row=1, column=col).font.copy(bold=True)
-    
-    # Data rows
+    widths = [len(header) for header in headers]
+    rows = []
     for idx, item in enumerate(items, 1):
-        ws.cell(row=idx + 1, column=1, value=idx)
-        ws.cell(row=idx + 1, column=2, value=item.get("brand", "N/A"))
-        ws.cell(row=idx + 1, column=3, value=item.get("capacity", "N/A"))
-        ws.cell(row=idx + 1, column=4, value=item.get("generation", "N/A"))
-        ws.cell(row=idx + 1, column=5, value=item.get("speed", "N/A"))
-        ws.cell(row=idx + 1, column=6, value=item.get("timestamp", "N/A"))
-    
-    # Auto-adjust column widths
-    for col in ws.columns:
-        max_length = 0
-        column = col[0].column_letter
-        for cell in col:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = adjusted_width
+        row = [
+            idx,
+            item.get("brand", "N/A"),
+            item.get("capacity", "N/A"),
+            item.get("generation", "N/A"),
+            item.get("speed", "N/A"),
+            item.get("timestamp", "N/A"),
+        ]
+        for col, value in enumerate(row):
+            widths[col] = max(widths[col], len(str(value)))
+        rows.append(row)
+    
+    # Column widths must be set before the first row is written
+    for col, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width + 2
+    
+    # Header row
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    ws.append(header_cells)
+    
+    for row in rows:
+        ws.append(row)
     
     # Save to bytes buffer
     buffer = io.BytesIO()
@@ -210,8 +529,7 @@ def export_session(session_id: str):
 @app.delete("/api/session/{session_id}")
 def end_session(session_id: str):
     """End and clean up a session"""
-    if session_id in sessions:
-        del sessions[session_id]
+    sessions.discard(session_id)
     return {"message": "Session ended", "session_id": session_id}
 
 if __name__ == "__main__":
@@ -16,6 +16,9 @@ interface ScannedItem extends HardwareData {
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
+// Longest edge of captured frames; the backend downscales to this anyway
+const MAX_CAPTURE_EDGE = 1024;
+
 export default function HardwareScanner() {
     const videoRef = useRef<HTMLVideoElement>(null);
     const canvasRef = useRef<HTMLCanvasElement>(null);
@@ -88,12 +91,13 @@ export default function HardwareScanner() {
 
         if (!ctx) return;
 
-        // Set canvas size to match video
-        canvas.width = video.videoWidth;
-        canvas.height = video.videoHeight;
+        // Set canvas size to the video frame, downscaled before upload
+        const scale = Math.min(1, MAX_CAPTURE_EDGE / Math.max(video.videoWidth, video.videoHeight));
+        canvas.width = Math.round(video.videoWidth * scale);
+        canvas.height = Math.round(video.videoHeight * scale);
 
         // Draw video frame to canvas
-        ctx.drawImage(video, 0, 0);
+        ctx.drawImage(video, 0, 0, canvas.width, canvas.height);
 
         // Get base64 image (remove data:image/jpeg;base64, prefix)
         const imageData = canvas.toDataURL('image/jpeg', 0.8);